@@ -4,132 +4,233 @@
 # Autor: John Restrepo Aparicio
 # ============================================================
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
-from io import StringIO
+import urllib3
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib
+matplotlib.use('Agg')  # backend sin ventana: los gráficos solo se guardan a disco
 import matplotlib.pyplot as plt
-import schedule
-import time
 from datetime import datetime
+import argparse
+import json
 import os
-import unicodedata
+import sys
 
 # ============================================================
 # 1️⃣ EXTRACCIÓN - Descarga desde la API (con paginación)
 # ============================================================
 
-def descargar_datos_completos():
-    print("⏳ Descargando datos completos desde la API de Datos Abiertos Colombia...")
-    
-    base_url = "https://www.datos.gov.co/resource/e97j-vuf7.csv"
-    all_data = []
-    limit = 50000  # máximo permitido por la API
-    offset = 0
+BASE_URL = "https://www.datos.gov.co/resource/e97j-vuf7.csv"
+PAGINAS_EN_PARALELO = 8  # páginas solicitadas simultáneamente
+TIMEOUT = (10, 60)  # segundos (conexión, lectura): un socket colgado no bloquea el proceso
+
 
-    while True:
-        params = {"$limit": limit, "$offset": offset}
-        response = requests.get(base_url, params=params)
+def crear_sesion():
+    """Sesión HTTP reutilizable (keep-alive) para las peticiones a la API."""
+    session = requests.Session()
+    session.headers.update({"Accept-Encoding": "gzip"})
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=PAGINAS_EN_PARALELO)
+    session.mount("https://", adapter)
+    return session
 
-        if response.status_code != 200:
-            print(f"❌ Error en la descarga ({response.status_code}). Deteniendo proceso.")
-            break
 
-        df_temp = pd.read_csv(StringIO(response.text), encoding="latin1")
+def descargar_pagina(session, base_url, offset, limit):
+    """Descarga y parsea una página; lanza requests.HTTPError si la API responde con error."""
+    params = {"$limit": limit, "$offset": offset}
+    response = session.get(base_url, params=params, stream=True, timeout=TIMEOUT)
 
-        if df_temp.empty:
-            break
+    # Un error (429, 5xx...) no puede confundirse con el final de los datos:
+    # se corta la descarga en vez de devolver un dataset incompleto
+    if response.status_code != 200:
+        response.close()
+        raise requests.HTTPError(
+            f"Error en la descarga ({response.status_code}) en el offset {offset}.",
+            response=response,
+        )
 
-        all_data.append(df_temp)
-        offset += limit
-        print(f"   → {offset} registros descargados...")
+    # Se lee directamente del stream (descomprimido) sin copiar el texto completo.
+    # Todas las columnas como texto: así todas las páginas comparten los mismos
+    # tipos y encajan en el esquema único del archivo Parquet. Se usa el
+    # parser C porque con engine="pyarrow" el dtype se aplica después de inferir
+    # tipos, y los nulos acaban como los textos "None"/"nan".
+    response.raw.decode_content = True
+    with response:
+        return pd.read_csv(response.raw, encoding="utf-8", engine="c", dtype=str)
 
-    df = pd.concat(all_data, ignore_index=True)
-    print(f"✅ Descarga completa: {len(df)} registros obtenidos.\n")
-    return df
+
+def descargar_paginas():
+    """Genera las páginas de la API (DataFrames) en orden, a medida que llegan."""
+    limit = 50000  # máximo permitido por la API
+    offset = 0
+
+    # Una sola sesión: se reutiliza la conexión TCP/TLS entre páginas.
+    # Se piden varias páginas a la vez de forma especulativa y se procesan en
+    # orden; la primera página vacía o incompleta termina la descarga y un
+    # error en cualquier página se propaga al llamador.
+    with crear_sesion() as session, ThreadPoolExecutor(max_workers=PAGINAS_EN_PARALELO) as executor:
+        terminado = False
+        while not terminado:
+            offsets = [offset + i * limit for i in range(PAGINAS_EN_PARALELO)]
+            paginas = executor.map(lambda o: descargar_pagina(session, BASE_URL, o, limit), offsets)
+
+            for df_temp in paginas:
+                if df_temp.empty:
+                    terminado = True
+                    break
+
+                offset += limit
+                print(f"   → {offset} registros descargados...")
+                yield df_temp
+
+                # Una página incompleta es la última: no hace falta otra tanda
+                if len(df_temp) < limit:
+                    terminado = True
+                    break
 
 
 # ============================================================
 # 2️⃣ TRANSFORMACIÓN Y LIMPIEZA
 # ============================================================
 
-def limpiar_datos(df):
-    print("🧹 Iniciando limpieza del dataset...")
+COLUMNAS_CLAVE = ('id', 'codigo', 'documento', 'caso')  # identificadores naturales
+VALORES_VACIOS = ['N/A', 'n/a', '']
 
-    # Corregir texto mal codificado
-    for col in df.select_dtypes(include='object').columns:
-        try:
-            df[col] = df[col].apply(
-                lambda x: x.encode('latin1').decode('utf-8') if isinstance(x, str) else x
-            )
-        except Exception:
-            pass
 
-    # Eliminar filas vacías y duplicadas
-    df = df.dropna(how='all')
-    df = df.drop_duplicates()
+def columna_clave(df):
+    """Primera columna identificadora presente, o None si no hay ninguna."""
+    return next((c for c in COLUMNAS_CLAVE if c in df.columns), None)
 
-    # Reemplazar valores vacíos comunes
-    df = df.replace({'N/A': None, 'n/a': None, '': None})
 
+def limpiar_pagina(df):
+    """Limpia una página de la API; también sirve para el dataset completo."""
     # --- Normalizar nombres de columnas ---
-    def normalizar_columna(nombre):
-        nfkd_form = unicodedata.normalize('NFKD', nombre)
-        solo_ascii = "".join([c for c in nfkd_form if not unicodedata.combining(c)])
-        return solo_ascii.lower().strip().replace(" ", "_")
-
-    df.columns = [normalizar_columna(c) for c in df.columns]
+    # NFKD separa las tildes y la codificación ASCII las descarta, todo vectorizado.
+    # set_axis devuelve un DataFrame nuevo: el del llamador no se modifica.
+    nuevas_columnas = (
+        pd.Index(df.columns)
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore').str.decode('ascii')
+        .str.lower().str.strip().str.replace(' ', '_', regex=False)
+    )
+    df = df.set_axis(nuevas_columnas, axis=1)
+
+    # Reemplazar valores vacíos comunes, solo en columnas de texto y con una
+    # comparación vectorizada (DataFrame.replace recorre todo)
+    texto = df.select_dtypes(include=['object', 'string']).columns
+    df[texto] = df[texto].mask(df[texto].isin(VALORES_VACIOS))
+
+    # Filas vacías y duplicadas se descartan con un único filtro en lugar de
+    # un filtro (y una copia) por paso. Si hay un identificador basta con
+    # comparar esa columna en vez de todas; las filas sin identificador no se
+    # descartan como duplicadas.
+    conservar = df.notna().any(axis=1)
+    clave = columna_clave(df)
+    if clave is not None:
+        conservar &= df[clave].isna() | ~df[clave].duplicated()
+    else:
+        conservar &= ~df.duplicated()
+    df = df[conservar]
 
     # Formatear fechas si existe la columna de publicación
     if 'fecha_publicacion' in df.columns:
-        df['fecha_publicacion'] = pd.to_datetime(df['fecha_publicacion'], errors='coerce')
-        meses = {
-            1: 'enero', 2: 'febrero', 3: 'marzo', 4: 'abril', 5: 'mayo', 6: 'junio',
-            7: 'julio', 8: 'agosto', 9: 'septiembre', 10: 'octubre', 11: 'noviembre', 12: 'diciembre'
-        }
-        df['fecha_texto'] = df['fecha_publicacion'].apply(
-            lambda x: f"{x.day} de {meses[x.month]} de {x.year}" if pd.notnull(x) else None
+        fechas = pd.to_datetime(df['fecha_publicacion'], errors='coerce')
+        # Índice 0 vacío para que el número de mes indexe directamente el arreglo
+        meses = np.array([
+            '', 'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+            'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+        ], dtype=object)
+        nombre_mes = pd.Series(
+            meses[fechas.dt.month.fillna(0).astype(int).to_numpy()], index=df.index
+        )
+        fecha_texto = (
+            fechas.dt.day.astype('Int64').astype(str) + ' de ' + nombre_mes
+            + ' de ' + fechas.dt.year.astype('Int64').astype(str)
+        )
+        # assign crea las columnas sobre un DataFrame propio, no sobre el
+        # resultado del filtro anterior (evita SettingWithCopyWarning)
+        df = df.assign(
+            fecha_publicacion=fechas,
+            fecha_texto=fecha_texto.where(fechas.notna(), None),
         )
 
-    print(f"📋 Columnas normalizadas: {df.columns.tolist()}")
-    print("✅ Limpieza completada.\n")
     return df
 
 
 # ============================================================
-# 3️⃣ VISUALIZACIONES (muestran y guardan resultados)
+# 3️⃣ VISUALIZACIONES (se guardan como PNG, sin mostrarse)
 # ============================================================
 
+# Carpeta de salida y estilo de los gráficos: se resuelven una sola vez al importar
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(_SCRIPT_DIR, "graficos")
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+plt.rcParams.update({
+    "figure.dpi": 80,
+    "axes.titlesize": 12,
+    "axes.labelsize": 10
+})
+
+
+def calcular_conteos(df):
+    """Conteos de los tres gráficos en un solo bloque; falta la clave si no existe la columna."""
+    conteos = {}
+
+    # Como categorías el conteo se hace sobre códigos enteros, no sobre textos
+    if 'pais' in df.columns:
+        # nlargest evita ordenar todos los países para quedarse con 10
+        conteos['pais'] = df['pais'].astype('category').value_counts(sort=False).nlargest(10)
+    if 'genero' in df.columns:
+        conteos['genero'] = df['genero'].astype('category').value_counts()
+
+    # La columna ya llega como fecha desde limpiar_pagina; los años son
+    # enteros en un rango corto, así que un bincount hace el histograma
+    # en una pasada, sin tabla hash ni ordenamiento
+    if 'fecha_publicacion' in df.columns:
+        anios = df['fecha_publicacion'].dt.year.dropna().to_numpy(dtype=np.int32)
+        if len(anios) > 0:
+            anio_min = anios.min()
+            casos = np.bincount(anios - anio_min)
+            conteos['anio'] = pd.Series(casos, index=range(anio_min, anio_min + len(casos)))
+        else:
+            conteos['anio'] = pd.Series(dtype='int64')
+
+    return conteos
+
+
 def generar_visualizaciones(df, rapido=True):
     print("📊 Generando visualizaciones...")
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_dir = os.path.join(script_dir, "graficos")
-    os.makedirs(output_dir, exist_ok=True)
-
     if rapido and len(df) > 50000:
-        df = df.sample(30000, random_state=42)
+        df = df.sample(30000, random_state=np.random.default_rng(42))
         print("⚡ Modo rápido activado: muestra de 30,000 filas.\n")
 
-    plt.rcParams.update({
-        "figure.dpi": 100,
-        "axes.titlesize": 12,
-        "axes.labelsize": 10
-    })
+    # Los gráficos solo dibujan a partir de estos conteos precalculados
+    conteos = calcular_conteos(df)
+
+    # Una sola figura reutilizada para los tres gráficos; se limpia entre uno y
+    # otro (fig.clear) para que el formato del pastel no pase a los demás ejes
+    fig = plt.figure()
 
     # 1️⃣ Top 10 países con más detenciones
-    if 'pais' in df.columns:
-        top_paises = df['pais'].value_counts().head(10)
+    if 'pais' in conteos:
+        top_paises = conteos['pais']
         if not top_paises.empty:
-            plt.figure(figsize=(10, 5))
-            top_paises.plot(kind='bar', color='skyblue')
-            plt.title("Top 10 países con más colombianos detenidos")
-            plt.xlabel("País")
-            plt.ylabel("Número de detenciones")
-            plt.tight_layout()
-            ruta = os.path.join(output_dir, "top_paises.png")
-            plt.savefig(ruta)
-            plt.show()
-            plt.close()
+            fig.clear()
+            ax = fig.add_subplot()
+            fig.set_size_inches(10, 5)
+            top_paises.plot(kind='bar', color='skyblue', ax=ax)
+            ax.set_title("Top 10 países con más colombianos detenidos")
+            ax.set_xlabel("País")
+            ax.set_ylabel("Número de detenciones")
+            fig.tight_layout()
+            ruta = os.path.join(OUTPUT_DIR, "top_paises.png")
+            fig.savefig(ruta)
             print(f"✅ Gráfico 'Top Países' guardado en: {ruta}")
         else:
             print("⚠️ No hay datos válidos en 'pais'.")
@@ -137,18 +238,18 @@ def generar_visualizaciones(df, rapido=True):
         print("⚠️ No se encontró la columna 'pais'.")
 
     # 2️⃣ Distribución por género
-    if 'genero' in df.columns:
-        genero_counts = df['genero'].value_counts()
+    if 'genero' in conteos:
+        genero_counts = conteos['genero']
         if not genero_counts.empty:
-            plt.figure(figsize=(5, 5))
-            genero_counts.plot(kind='pie', autopct='%1.1f%%', startangle=90, colors=['#ffb347', '#77dd77'])
-            plt.title("Distribución por género")
-            plt.ylabel("")
-            plt.tight_layout()
-            ruta = os.path.join(output_dir, "distribucion_genero.png")
-            plt.savefig(ruta)
-            plt.show()
-            plt.close()
+            fig.clear()
+            ax = fig.add_subplot()
+            fig.set_size_inches(5, 5)
+            genero_counts.plot(kind='pie', autopct='%1.1f%%', startangle=90, colors=['#ffb347', '#77dd77'], ax=ax)
+            ax.set_title("Distribución por género")
+            ax.set_ylabel("")
+            fig.tight_layout()
+            ruta = os.path.join(OUTPUT_DIR, "distribucion_genero.png")
+            fig.savefig(ruta)
             print(f"✅ Gráfico 'Distribución Género' guardado en: {ruta}")
         else:
             print("⚠️ No hay datos válidos en 'genero'.")
@@ -156,85 +257,281 @@ def generar_visualizaciones(df, rapido=True):
         print("⚠️ No se encontró la columna 'genero'.")
 
     # 3️⃣ Evolución anual de detenciones
-    if 'fecha_publicacion' in df.columns:
-        df['fecha_publicacion'] = pd.to_datetime(df['fecha_publicacion'], errors='coerce')
-        if df['fecha_publicacion'].notnull().sum() > 0:
-            df['anio'] = df['fecha_publicacion'].dt.year
-            casos_anuales = df['anio'].value_counts().sort_index()
-            plt.figure(figsize=(10, 5))
-            casos_anuales.plot(kind='line', marker='o', color='coral')
-            plt.title("Evolución anual de detenciones")
-            plt.xlabel("Año")
-            plt.ylabel("Número de casos")
-            plt.tight_layout()
-            ruta = os.path.join(output_dir, "evolucion_anual.png")
-            plt.savefig(ruta)
-            plt.show()
-            plt.close()
+    if 'anio' in conteos:
+        casos_anuales = conteos['anio']
+        if not casos_anuales.empty:
+            fig.clear()
+            ax = fig.add_subplot()
+            fig.set_size_inches(10, 5)
+            casos_anuales.plot(kind='line', marker='o', color='coral', ax=ax)
+            ax.set_title("Evolución anual de detenciones")
+            ax.set_xlabel("Año")
+            ax.set_ylabel("Número de casos")
+            fig.tight_layout()
+            ruta = os.path.join(OUTPUT_DIR, "evolucion_anual.png")
+            fig.savefig(ruta)
             print(f"✅ Gráfico 'Evolución Anual' guardado en: {ruta}")
         else:
             print("⚠️ No hay fechas válidas en 'fecha_publicacion'.")
     else:
         print("⚠️ No se encontró la columna 'fecha_publicacion'.")
 
-    print(f"🎨 Visualizaciones guardadas en: {output_dir}\n")
+    plt.close(fig)
+    print(f"🎨 Visualizaciones guardadas en: {OUTPUT_DIR}\n")
 
 
 # ============================================================
 # 4️⃣ PIPELINE COMPLETO
 # ============================================================
 
-def ejecutar_pipeline(rapido=True):
-    print(f"🚀 Ejecutando pipeline ETL ({'modo rápido' if rapido else 'modo completo'})...\n")
-    df = descargar_datos_completos()
-    df_limpio = limpiar_datos(df)
+COLUMNAS_GRAFICOS = ('pais', 'genero', 'fecha_publicacion')
+FILAS_POR_GRUPO = 64_000  # tamaño máximo de cada row group del Parquet
 
-    salida = os.path.join(os.getcwd(), "colombianos_detenidos_limpio.csv")
-    df_limpio.to_csv(salida, index=False, encoding='utf-8-sig')
 
+def cargar_local(ruta, columnas=None):
+    """Lee el Parquet persistido mapeándolo en memoria; solo las columnas pedidas que existan."""
+    if columnas is not None:
+        disponibles = pq.read_schema(ruta).names
+        columnas = [c for c in columnas if c in disponibles]
+    return pd.read_parquet(ruta, columns=columnas, memory_map=True)
+
+
+def esquema_parquet(tabla):
+    """Esquema de la primera página, con las columnas totalmente vacías como texto."""
+    return pa.schema([
+        campo.with_type(pa.string()) if pa.types.is_null(campo.type) else campo
+        for campo in tabla.schema
+    ])
+
+
+def ejecutar_pipeline(rapido=True, exportar_csv=False):
+    print(f"🚀 Ejecutando pipeline ETL ({'modo rápido' if rapido else 'modo completo'})...\n")
+    print("⏳ Descargando y limpiando datos desde la API de Datos Abiertos Colombia...")
+
+    salida = os.path.join(os.getcwd(), "colombianos_detenidos_limpio.parquet")
+    salida_csv = salida.replace('.parquet', '.csv')
+    # Se escribe en temporales: los archivos finales solo se reemplazan si todo termina bien
+    temporal = salida + '.tmp'
+    temporal_csv = salida_csv + '.tmp'
+
+    # Cada página se limpia y se escribe a disco en cuanto llega, de modo que
+    # nunca se tiene el dataset crudo completo en memoria. Los duplicados entre
+    # páginas se detectan con el hash del identificador (o de la fila completa
+    # si no lo hay), con el mismo criterio que limpiar_pagina. Los hashes ya
+    # vistos se guardan en un set: consultar y agregar cuesta O(1) por fila,
+    # sin reordenar ni copiar los de páginas anteriores.
+    writer = None
+    archivo_csv = open(temporal_csv, 'w', encoding='utf-8-sig', newline='') if exportar_csv else None
+    vistos = set()
+    total = 0
+    completado = False
+    try:
+        for pagina in descargar_paginas():
+            df_pagina = limpiar_pagina(pagina)
+
+            clave = columna_clave(df_pagina)
+            if clave is not None:
+                hashes = pd.util.hash_pandas_object(df_pagina[clave], index=False).to_numpy()
+                validas = df_pagina[clave].notna().to_numpy()
+            else:
+                hashes = pd.util.hash_pandas_object(df_pagina, index=False).to_numpy()
+                validas = np.ones(len(hashes), dtype=bool)
+            hashes = hashes.tolist()
+            repetidas = np.fromiter((h in vistos for h in hashes), dtype=bool, count=len(hashes))
+            repetidas &= validas
+            df_pagina = df_pagina[~repetidas]
+            vistos.update(h for h, nueva in zip(hashes, validas & ~repetidas) if nueva)
+            if df_pagina.empty:
+                continue
+
+            tabla = pa.Table.from_pandas(df_pagina, preserve_index=False)
+            if writer is None:
+                # Diccionario: países, géneros, etc. se guardan una vez por grupo
+                writer = pq.ParquetWriter(
+                    temporal, esquema_parquet(tabla), compression='zstd', use_dictionary=True
+                )
+            writer.write_table(tabla.cast(writer.schema), row_group_size=FILAS_POR_GRUPO)
+
+            # Copia opcional en CSV para quien necesite abrirla en Excel
+            if archivo_csv is not None:
+                df_pagina.to_csv(archivo_csv, index=False, header=(total == 0))
+
+            total += len(df_pagina)
+        completado = True
+    except (requests.RequestException, urllib3.exceptions.HTTPError) as error:
+        # Descarga cortada (HTTP 429/5xx, conexión caída...): el resultado
+        # estaría incompleto, así que no se guarda ni se da por actualizado
+        print(f"❌ {error} Pipeline detenido; se conserva el archivo anterior.\n")
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+        if archivo_csv is not None:
+            archivo_csv.close()
+        # Ante un error (o sin registros) se descartan los temporales y se
+        # conservan intactos los archivos de la ejecución anterior
+        if not completado or writer is None:
+            for ruta in (temporal, temporal_csv):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+    if writer is None:
+        print("❌ No se obtuvieron registros de la API. Pipeline detenido.\n")
+        return False
+
+    os.replace(temporal, salida)
+    if exportar_csv:
+        os.replace(temporal_csv, salida_csv)
+    print(f"📋 Columnas normalizadas: {writer.schema.names}")
     print(f"💾 Archivo limpio guardado en: {salida}")
-    print(f"Total de registros finales: {len(df_limpio)}\n")
+    if exportar_csv:
+        print(f"💾 Copia CSV guardada en: {salida_csv}")
+    print(f"Total de registros finales: {total}\n")
 
+    # Para los gráficos solo se cargan las columnas que se usan
+    df_limpio = cargar_local(salida, COLUMNAS_GRAFICOS)
     generar_visualizaciones(df_limpio, rapido)
     print("🎯 Pipeline completado exitosamente.\n")
+    return True
 
 
 # ============================================================
 # 5️⃣ PREFETCH Y AUTOMATIZACIÓN MENSUAL
 # ============================================================
 
-def prefetch_mensual():
-    salida = os.path.join(os.getcwd(), "colombianos_detenidos_limpio.csv")
-    
-    if not os.path.exists(salida):
-        print("📥 No se encontró archivo previo. Descargando por primera vez...")
-        ejecutar_pipeline(rapido=False)
-        return
-    
-    ultima_modificacion = datetime.fromtimestamp(os.path.getmtime(salida))
-    dias_desde_actualizacion = (datetime.now() - ultima_modificacion).days
+def leer_validadores(ruta):
+    """ETag / Last-Modified guardados en la última descarga (vacío si no hay)."""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_validadores(ruta, validadores):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(validadores, f)
+
+
+def consultar_cambios(validadores):
+    """GET condicional a la API; devuelve (hay_cambios, validadores actuales)."""
+    headers = {}
+    if validadores.get('etag'):
+        headers['If-None-Match'] = validadores['etag']
+    if validadores.get('last_modified'):
+        headers['If-Modified-Since'] = validadores['last_modified']
+
+    # Basta con una fila: los validadores dependen de la versión del dataset.
+    # Si la consulta falla se asume que hay cambios y sin validadores: el
+    # pipeline intentará la descarga y decidirá el resultado.
+    try:
+        with crear_sesion() as session:
+            response = session.get(
+                BASE_URL, params={"$limit": 1}, headers=headers, stream=True, timeout=TIMEOUT
+            )
+            response.close()
+    except (requests.RequestException, urllib3.exceptions.HTTPError) as error:
+        print(f"⚠️ No se pudo consultar si el dataset cambió: {error}")
+        return True, {}
+
+    if response.status_code == 304:
+        return False, validadores
+    if response.status_code != 200:
+        return True, {}
+    return True, {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+
+
+def usar_archivo_local(salida, rapido, exportar_csv):
+    """Sin descarga: gráficos (y copia CSV si se pidió) a partir del Parquet local."""
+    if exportar_csv:
+        salida_csv = salida.replace('.parquet', '.csv')
+        temporal_csv = salida_csv + '.tmp'
+        cargar_local(salida).to_csv(temporal_csv, index=False, encoding='utf-8-sig')
+        os.replace(temporal_csv, salida_csv)
+        print(f"💾 Copia CSV guardada en: {salida_csv}")
+    generar_visualizaciones(cargar_local(salida, COLUMNAS_GRAFICOS), rapido)
+
+
+def prefetch_mensual(rapido=False, exportar_csv=False):
+    """Actualiza los datos si hace falta; devuelve False si la descarga falló."""
+    salida = os.path.join(os.getcwd(), "colombianos_detenidos_limpio.parquet")
+    ruta_validadores = os.path.join(os.getcwd(), "colombianos_detenidos_limpio.http.json")
+
+    if os.path.exists(salida):
+        ultima_modificacion = datetime.fromtimestamp(os.path.getmtime(salida))
+        dias_desde_actualizacion = (datetime.now() - ultima_modificacion).days
+
+        if dias_desde_actualizacion < 30:
+            print(f"✅ El archivo está actualizado ({dias_desde_actualizacion} días desde la última descarga).")
+            usar_archivo_local(salida, rapido, exportar_csv)
+            return True
+
+        # Si la API responde 304 el dataset no cambió: se renueva la fecha del
+        # archivo local y se evita repetir todo el ETL
+        hay_cambios, validadores = consultar_cambios(leer_validadores(ruta_validadores))
+        if not hay_cambios:
+            os.utime(salida, None)
+            print(f"✅ Han pasado {dias_desde_actualizacion} días, pero el dataset no ha cambiado en la API.")
+            usar_archivo_local(salida, rapido, exportar_csv)
+            return True
 
-    if dias_desde_actualizacion >= 30:
         print(f"📆 Han pasado {dias_desde_actualizacion} días desde la última actualización. Prefetch activado.")
-        ejecutar_pipeline(rapido=False)
     else:
-        print(f"✅ El archivo está actualizado ({dias_desde_actualizacion} días desde la última descarga).")
+        print("📥 No se encontró archivo previo. Descargando por primera vez...")
+        _, validadores = consultar_cambios({})
+
+    if not ejecutar_pipeline(rapido=rapido, exportar_csv=exportar_csv):
+        return False
+    guardar_validadores(ruta_validadores, validadores)
+    return True
 
 
 # ============================================================
 # 6️⃣ EJECUCIÓN PRINCIPAL
 # ============================================================
+# Para correrlo de forma automática se delega la programación al sistema
+# operativo en lugar de dejar un proceso de Python esperando. Por ejemplo,
+# con cron (crontab -e):
+#
+#   @monthly cd /ruta/al/proyecto && python proyecto_final_ETL.py
+#
+# o con un timer de systemd:
+#
+#   # ~/.config/systemd/user/etl-detenidos.service
+#   [Unit]
+#   Description=Pipeline ETL colombianos detenidos en el exterior
+#
+#   [Service]
+#   Type=oneshot
+#   WorkingDirectory=/ruta/al/proyecto
+#   ExecStart=/usr/bin/python3 proyecto_final_ETL.py
+#
+#   # ~/.config/systemd/user/etl-detenidos.timer
+#   [Timer]
+#   OnCalendar=monthly
+#   Persistent=true
+#
+#   [Install]
+#   WantedBy=timers.target
+#
+#   systemctl --user enable --now etl-detenidos.timer
+#
+# prefetch_mensual solo descarga si el archivo tiene 30 días o más, así que
+# ejecutarlo con más frecuencia no repite el ETL.
 
 if __name__ == "__main__":
-    print("🕒 Iniciando ejecución del pipeline ETL con prefetch mensual...\n")
+    parser = argparse.ArgumentParser(description="Pipeline ETL de colombianos detenidos en el exterior")
+    parser.add_argument("--csv", action="store_true",
+                        help="guardar también una copia CSV (UTF-8 con BOM) además del Parquet")
+    args = parser.parse_args()
 
-    prefetch_mensual()
-    ejecutar_pipeline(rapido=True)
+    print("🕒 Iniciando ejecución del pipeline ETL con prefetch mensual...\n")
 
-    # Si se dese correr de forma automática,quitar comemnts
-    # schedule.every(30).days.do(prefetch_mensual)
-    # while True:
-    #     schedule.run_pending()
-    #     time.sleep(3600)
+    # Código de salida distinto de cero para que cron/systemd registren el fallo
+    if not prefetch_mensual(exportar_csv=args.csv):
+        print("❌ Proceso fallido: no se pudieron actualizar los datos.")
+        sys.exit(1)
 
     print("✅ Proceso finalizado. Archivos y gráficos generados correctamente.")